@@ -3,11 +3,13 @@ import json
 import logging
 import os
 import pprint
+import re
 
 import pandas as pd
 import requests
 
 API_URL = 'https://earthexplorer.usgs.gov/inventory/json/v/1.4.0/'
+INT_RANGE_RE = re.compile(r'\s*(?P<FIRST>\d+)\s*(?:-\s*(?P<LAST>\d+)\s*)?$')
 
 
 def main(username, password, wrs2_tiles, years, csv_folder=os.getcwd(),
@@ -63,6 +65,13 @@ def main(username, password, wrs2_tiles, years, csv_folder=os.getcwd(),
     # Keep the following search result fields (but rename)
     result_fields = ['entityId', 'displayId', 'acquisitionDate', 'browseUrl']
 
+    # Output field order (alphabetical, same as sorting the column labels)
+    output_cols = [
+        acq_date_col, browse_url_col, col_category_col, col_number_col,
+        data_type_col, product_id_col, scene_id_col, wrs2_tile_col,
+        wrs2_path_col, wrs2_row_col,
+    ]
+
     # Output file names (to match bulk metadata file names)
     csv_names = {
         'LANDSAT_8_C1': 'LANDSAT_8_C1.csv',
@@ -167,7 +176,6 @@ def main(username, password, wrs2_tiles, years, csv_folder=os.getcwd(),
                 logging.debug(pprint.pformat([r['displayId'] for r in results]))
 
                 output_list.extend(results)
-                # input('ENTER')
 
         # Save results to CSV by Landsat type (to match bulk files)
         if output_list:
@@ -190,17 +198,17 @@ def main(username, password, wrs2_tiles, years, csv_folder=os.getcwd(),
                 .str.slice(35, 37).astype(int)
             output_df[col_category_col] = output_df[product_id_col]\
                 .str.slice(38, 40)
-            output_df[wrs2_tile_col] = output_df[[wrs2_path_col, wrs2_row_col]]\
-                .apply(lambda x: 'p{:03d}r{:03d}'.format(x[0], x[1]), axis=1)
+            output_df[wrs2_tile_col] = (
+                'p' + output_df[wrs2_path_col].astype(str).str.zfill(3) +
+                'r' + output_df[wrs2_row_col].astype(str).str.zfill(3))
 
             # Apply basic high latitude filtering based on path
-            output_df = output_df[output_df[wrs2_row_col] < 100]
-            output_df = output_df[output_df[wrs2_row_col] > 9]
+            # Use a single between() mask so the dataframe is only sliced once
+            output_df = output_df[output_df[wrs2_row_col].between(10, 99)]
 
             if not output_df.empty:
                 logging.debug('\nSaving CSV')
-                output_df.sort_index(axis=1, inplace=True)
-                output_df.to_csv(output_path, index=None)
+                output_df[output_cols].to_csv(output_path, index=None)
 
 
 def api_login(username, password):
@@ -244,30 +252,15 @@ def parse_int_set(nputstr=""):
     http://thoughtsbyclayg.blogspot.com/2008/10/parsing-list-of-numbers-in-python.html
     """
     selection = set()
-    invalid = set()
-    # tokens are comma separated values
-    tokens = [x.strip() for x in nputstr.split(',')]
-    for i in tokens:
-        try:
-            # typically tokens are plain old integers
-            selection.add(int(i))
-        except:
-            # if not, then it might be a range
-            try:
-                token = [int(k.strip()) for k in i.split('-')]
-                if len(token) > 1:
-                    token.sort()
-                    # we have items separated by a dash
-                    # try to build a valid range
-                    first = token[0]
-                    last = token[len(token) - 1]
-                    for x in range(first, last + 1):
-                        selection.add(x)
-            except:
-                # not an int and not a range...
-                invalid.add(i)
-    # Report invalid tokens before returning valid selection
-    # print "Invalid set: " + str(invalid)
+    # tokens are comma separated values or ranges
+    # Tokens that are not an int or a range are skipped
+    for token in nputstr.split(','):
+        m = INT_RANGE_RE.match(token)
+        if not m:
+            continue
+        first = int(m.group('FIRST'))
+        last = int(m.group('LAST') or first)
+        selection.update(range(min(first, last), max(first, last) + 1))
     return selection
 
 
@@ -10,6 +10,9 @@ import sys
 
 import pandas as pd
 
+WRS2_TILE_RE = re.compile(r'p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+INT_RANGE_RE = re.compile(r'\s*(?P<FIRST>\d+)\s*(?:-\s*(?P<LAST>\d+)\s*)?$')
+
 
 def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
          years=None, skip_list_path=None, summary_flag=True, id_type='product'):
@@ -71,10 +74,11 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
         'LANDSAT_ETM_C1.csv',
         'LANDSAT_TM_C1.csv',
     ]
+    # First and last year of data in each CSV file
     csv_years = {
-        'LANDSAT_8_C1.csv': set(range(2013, 2099)),
-        'LANDSAT_ETM_C1.csv': set(range(1999, 2099)),
-        'LANDSAT_TM_C1.csv': set(range(1984, 2012)),
+        'LANDSAT_8_C1.csv': (2013, 2098),
+        'LANDSAT_ETM_C1.csv': (1999, 2098),
+        'LANDSAT_TM_C1.csv': (1984, 2011),
     }
 
     product_id_col = 'LANDSAT_PRODUCT_ID'
@@ -82,11 +86,23 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
     wrs2_row_col = 'WRS_ROW'
     wrs2_tile_col = 'WRS2_TILE'
 
+    # Only load the following columns from the CSV
+    # The bulk metadata path/row fields are only used to detect unfiltered CSVs
+    input_cols = set([
+        product_id_col, wrs2_path_col, wrs2_row_col, wrs2_tile_col,
+        'path', 'row'])
+    # Set the data types to skip the type inference
+    dtype_cols = {
+        product_id_col: str,
+        wrs2_path_col: 'int16',
+        wrs2_row_col: 'int16',
+        wrs2_tile_col: str,
+    }
+
     quicklook_re = re.compile(
-        '(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_'
-        '(?P<doy>\d{3})_(?P<landsat>\w{4}).jpg')
+        r'(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_'
+        r'(?P<doy>\d{3})_(?P<landsat>\w{4}).jpg')
     wrs2_tile_fmt = 'p{:03d}r{:03d}'
-    # wrs2_tile_re = re.compile('p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
 
     if id_type.lower() == 'short':
         logging.info('\nUsing shortened Landsat ID')
@@ -108,7 +124,8 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
     if skip_list_path:
         with open(skip_list_path, 'r') as skip_f:
             input_skip_list = skip_f.readlines()
-            input_skip_list = [item.strip()[:16] for item in input_skip_list]
+            input_skip_list = set([
+                item.strip()[:16] for item in input_skip_list])
 
     # Read in metadata CSV files
     logging.info('\nReading metadata CSV files')
@@ -117,14 +134,21 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
         csv_path = os.path.join(csv_folder, csv_name)
         logging.info('{}'.format(csv_name))
 
-        if year_list and not csv_years[csv_name].intersection(set(year_list)):
+        # The year lists are sorted, so compare against the range endpoints
+        if year_list and (year_list[-1] < csv_years[csv_name][0] or
+                          year_list[0] > csv_years[csv_name][1]):
             logging.info('  No data for target year(s), skipping file')
             continue
         elif not os.path.isfile(csv_path):
             logging.info('  The CSV file does not exist, skipping')
 
         try:
-            input_df = pd.read_csv(csv_path)
+            # Read the header first so the parser can be given the exact
+            #   fields to keep instead of testing each one with a callable
+            header_cols = pd.read_csv(csv_path, nrows=0).columns
+            input_df = pd.read_csv(
+                csv_path, dtype=dtype_cols,
+                usecols=[x for x in header_cols if x in input_cols])
         except Exception as e:
             logging.warning('  The CSV file could not be read, skipping')
             logging.debug('  Exception: {}'.format(e))
@@ -155,24 +179,26 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
                 wrs2_row_col in input_df.columns.values):
             logging.debug('  {} field doesn\'t exist, adding'.format(
                 wrs2_tile_col))
-            input_df[wrs2_tile_col] = input_df[[wrs2_path_col, wrs2_row_col]] \
-                .apply(lambda x: 'p{:03d}r{:03d}'.format(x[0], x[1]),
-                       axis=1)
+            input_df[wrs2_tile_col] = (
+                'p' + input_df[wrs2_path_col].astype(str).str.zfill(3) +
+                'r' + input_df[wrs2_row_col].astype(str).str.zfill(3))
 
         # Compute quicklook image name from PRODUCT_ID
-        input_df['QUICKLOOK'] = input_df[[product_id_col]].apply(
-            lambda x: '{}_{}.jpg'.format(
-                dt.datetime.strptime(x[0][17:25], '%Y%m%d').strftime('%Y%m%d_%j'),
-                x[0][:4]),
-            axis=1)
+        product_ids = input_df[product_id_col].str
+        acq_dates = product_ids.slice(17, 25)
+        acq_doys = pd.to_datetime(acq_dates, format='%Y%m%d').dt.dayofyear
+        input_df['QUICKLOOK'] = (
+            acq_dates + '_' + acq_doys.astype(str).str.zfill(3) + '_' +
+            product_ids.slice(0, 4) + '.jpg')
         # print(input_df.head())
         input_df.set_index([wrs2_tile_col, 'QUICKLOOK'],
                            drop=True, inplace=True)
 
         if id_type.lower() == 'short':
-            input_df['temp_id'] = input_df[[product_id_col]].apply(
-                lambda x: '{}_{}_{}'.format(x[0][0:4], x[0][10:16], x[0][17:25]),
-                axis=1)
+            input_df['temp_id'] = (
+                input_df[product_id_col].str.slice(0, 4) + '_' +
+                input_df[product_id_col].str.slice(10, 16) + '_' +
+                input_df[product_id_col].str.slice(17, 25))
             update_dict = input_df['temp_id'].to_dict()
         else:
             update_dict = input_df[product_id_col].to_dict()
@@ -183,23 +209,25 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
     logging.debug('\nQuicklook PRODUCT_ID lookup:')
     logging.debug(pprint.pformat(quicklook_ids))
     logging.info('')
-    # input('ENTER')
+
+    # This should only match path/row folders directly in quicklook folder
+    # Build a single pattern from the OS path separator and compile it once
+    #   instead of rebuilding it for every walked folder
+    pr_folder_re = re.compile(
+        r'{0}{1}p(\d{{3}})r(\d{{3}}){1}(\d{{4}})({1}{2})?'.format(
+            re.escape(os.path.basename(quicklook_folder)),
+            re.escape(os.sep), cloud_folder))
+
+    # Use sets for the membership tests on each walked folder
+    wrs2_tile_set = set(wrs2_tile_list)
+    path_set = set(path_list)
+    row_set = set(row_list)
+    year_set = set(year_list)
 
     output_keep_list = []
     output_skip_list = []
     for root, dirs, files in os.walk(quicklook_folder):
-        # This should only match path/row folders directly in quicklook folder
-        # DEADBEEF: Need better cross platform solution
-        if os.name == 'nt':
-            pr_match = re.search(
-                '{}\\\p(\d{{3}})r(\d{{3}})\\\(\d{{4}})(\\\{})?'.format(
-                    os.path.basename(quicklook_folder), cloud_folder),
-                root)
-        elif os.name == 'posix':
-            pr_match = re.search(
-                '{}/p(\d{{3}})r(\d{{3}})/(\d{{4}})(/{})?'.format(
-                    os.path.basename(quicklook_folder), cloud_folder),
-                root)
+        pr_match = pr_folder_re.search(root)
         if not pr_match:
             continue
 
@@ -207,16 +235,16 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
         wrs2_tile = wrs2_tile_fmt.format(path, row)
 
         # Skip scenes first by path/row
-        if wrs2_tile_list and wrs2_tile not in wrs2_tile_list:
+        if wrs2_tile_set and wrs2_tile not in wrs2_tile_set:
             logging.info('{} - path/row, skipping'.format(root))
             continue
-        elif path_list and path not in path_list:
+        elif path_set and path not in path_set:
             logging.info('{} - path, skipping'.format(root))
             continue
-        elif row_list and row not in row_list:
+        elif row_set and row not in row_set:
             logging.info('{} - row, skipping'.format(root))
             continue
-        elif year_list and year not in year_list:
+        elif year_set and year not in year_set:
             logging.info('{} - year, skipping'.format(root))
             continue
         else:
@@ -288,15 +316,22 @@ def main(csv_folder, quicklook_folder, output_folder, wrs2_tiles=None,
 
 def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
     """Setup path/row lists"""
+    # Nothing to check if no WRS2 filtering was requested
+    if not wrs2_tile_list and not path_list and not row_list:
+        return [], [], []
+
     wrs2_tile_fmt = 'p{:03d}r{:03d}'
-    wrs2_tile_re = re.compile('p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+
+    # Match each tile once and keep the integer path/row pairs
+    wrs2_tile_pairs = [
+        (int(m.group('PATH')), int(m.group('ROW')))
+        for pr in wrs2_tile_list
+        for m in [WRS2_TILE_RE.match(pr)] if m]
 
     # Force path/row list to zero padded three digit numbers
     if wrs2_tile_list:
         wrs2_tile_list = sorted([
-            wrs2_tile_fmt.format(int(m.group('PATH')), int(m.group('ROW')))
-            for wrs2_tile in wrs2_tile_list
-            for m in [wrs2_tile_re.match(wrs2_tile)] if m])
+            wrs2_tile_fmt.format(path, row) for path, row in wrs2_tile_pairs])
 
     # If path_list and row_list were specified, force to integer type
     # Declare variable as an empty list if it does not exist
@@ -317,17 +352,10 @@ def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
 
     # Convert wrs2_tile_list to path_list and row_list if not set
     # Pre-filtering on path and row separately is faster than building wrs2_tile
-    # This is a pretty messy way of doing this...
     if wrs2_tile_list and not path_list:
-        path_list = sorted(list(set([
-            int(wrs2_tile_re.match(wrs2_tile).group('PATH'))
-            for wrs2_tile in wrs2_tile_list
-            if wrs2_tile_re.match(wrs2_tile)])))
+        path_list = sorted(set([path for path, row in wrs2_tile_pairs]))
     if wrs2_tile_list and not row_list:
-        row_list = sorted(list(set([
-            int(wrs2_tile_re.match(wrs2_tile).group('ROW'))
-            for wrs2_tile in wrs2_tile_list
-            if wrs2_tile_re.match(wrs2_tile)])))
+        row_list = sorted(set([row for path, row in wrs2_tile_pairs]))
     if path_list:
         logging.debug('  Paths: {}'.format(
             ' '.join(list(map(str, path_list)))))
@@ -360,30 +388,15 @@ def parse_int_set(nputstr=""):
     http://thoughtsbyclayg.blogspot.com/2008/10/parsing-list-of-numbers-in-python.html
     """
     selection = set()
-    invalid = set()
-    # tokens are comma separated values
-    tokens = [x.strip() for x in nputstr.split(',')]
-    for i in tokens:
-        try:
-            # typically tokens are plain old integers
-            selection.add(int(i))
-        except:
-            # if not, then it might be a range
-            try:
-                token = [int(k.strip()) for k in i.split('-')]
-                if len(token) > 1:
-                    token.sort()
-                    # we have items separated by a dash
-                    # try to build a valid range
-                    first = token[0]
-                    last = token[len(token) - 1]
-                    for x in range(first, last + 1):
-                        selection.add(x)
-            except:
-                # not an int and not a range...
-                invalid.add(i)
-    # Report invalid tokens before returning valid selection
-    # print "Invalid set: " + str(invalid)
+    # tokens are comma separated values or ranges
+    # Tokens that are not an int or a range are skipped
+    for token in nputstr.split(','):
+        m = INT_RANGE_RE.match(token)
+        if not m:
+            continue
+        first = int(m.group('FIRST'))
+        last = int(m.group('LAST') or first)
+        selection.update(range(min(first, last), max(first, last) + 1))
     return selection
 
 
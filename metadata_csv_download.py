@@ -1,12 +1,17 @@
 import argparse
+from concurrent import futures
 import gzip
 import logging
 import os
+import re
+import shutil
 
 import requests
 
+INT_RANGE_RE = re.compile(r'\s*(?P<FIRST>\d+)\s*(?:-\s*(?P<LAST>\d+)\s*)?$')
 
-def main(csv_folder, years=None, overwrite_flag=False):
+
+def main(csv_folder, years=None, overwrite_flag=False, threads=3):
     """Download Landsat Collection 1 bulk metadata CSV GZ files and extract
 
     Parameters
@@ -20,6 +25,8 @@ def main(csv_folder, years=None, overwrite_flag=False):
         Example: ['1984', '2000-2015']
     overwrite_flag : bool, optional
         If True, overwrite existing CSV files (the default is False).
+    threads : int, optional
+        Number of files to download concurrently (the default is 3).
 
     Notes
     -----
@@ -52,6 +59,7 @@ def main(csv_folder, years=None, overwrite_flag=False):
     else:
         user_years = set()
 
+    download_list = []
     for gz_name in gz_file_list:
         logging.info('{}'.format(gz_name))
         csv_name = gz_name.replace('.gz', '')
@@ -80,11 +88,24 @@ def main(csv_folder, years=None, overwrite_flag=False):
                 decompress_gz(gz_path, csv_path)
                 continue
 
-        # Trying to catch errors when the bulk metadata site is down
-        download_file(file_url, gz_path)
+        download_list.append([file_url, gz_path, csv_path])
+
+    # The downloads are I/O bound, so fetch the files concurrently
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        future_list = [
+            executor.submit(download_csv, file_url, gz_path, csv_path)
+            for file_url, gz_path, csv_path in download_list]
+        for future in futures.as_completed(future_list):
+            future.result()
+
+
+def download_csv(file_url, gz_path, csv_path):
+    """Download and extract a single bulk metadata CSV GZ file"""
+    # Trying to catch errors when the bulk metadata site is down
+    download_file(file_url, gz_path)
 
-        # Unpack the CSV gz file
-        decompress_gz(gz_path, csv_path)
+    # Unpack the CSV gz file
+    decompress_gz(gz_path, csv_path)
 
 
 def download_file(file_url, file_path):
@@ -92,28 +113,23 @@ def download_file(file_url, file_path):
     logging.debug('  Downloading file')
     logging.debug('  {}'.format(file_url))
     try:
-        r = requests.get(file_url)
+        r = requests.get(file_url, stream=True)
         with open(file_path, 'wb') as output_f:
-            for chunk in r.iter_content(chunk_size=128):
+            for chunk in r.iter_content(chunk_size=1 << 20):
                 output_f.write(chunk)
     except Exception as e:
         logging.info('  {}\n  Try manually checking the bulk metadata '
                      'website\n'.format(e))
 
 
-def decompress_gz(input_path, output_path, blocksize=1 << 14):
+def decompress_gz(input_path, output_path, blocksize=1 << 20):
     """"""
     logging.debug('  Extracting CSV file')
     try:
+        # Stream the raw bytes through in large blocks
         with gzip.open(input_path, 'rb') as input_f:
-            with open(output_path, 'wb') as output_f:
-                while True:
-                    block = input_f.read(blocksize)
-                    if block == '' or block == b'':
-                        break
-                    output_f.write(block)
-            # with open(output_path, 'wb') as output_f:
-            #     output_f.write(input_f.read())
+            with open(output_path, 'wb', buffering=blocksize) as output_f:
+                shutil.copyfileobj(input_f, output_f, blocksize)
     except Exception as e:
         logging.error('  Unhandled Exception: {}'.format(e))
         try:
@@ -145,30 +161,15 @@ def parse_int_set(nputstr=""):
     http://thoughtsbyclayg.blogspot.com/2008/10/parsing-list-of-numbers-in-python.html
     """
     selection = set()
-    invalid = set()
-    # tokens are comma separated values
-    tokens = [x.strip() for x in nputstr.split(',')]
-    for i in tokens:
-        try:
-            # typically tokens are plain old integers
-            selection.add(int(i))
-        except:
-            # if not, then it might be a range
-            try:
-                token = [int(k.strip()) for k in i.split('-')]
-                if len(token) > 1:
-                    token.sort()
-                    # we have items separated by a dash
-                    # try to build a valid range
-                    first = token[0]
-                    last = token[len(token) - 1]
-                    for x in range(first, last + 1):
-                        selection.add(x)
-            except:
-                # not an int and not a range...
-                invalid.add(i)
-    # Report invalid tokens before returning valid selection
-    # print "Invalid set: " + str(invalid)
+    # tokens are comma separated values or ranges
+    # Tokens that are not an int or a range are skipped
+    for token in nputstr.split(','):
+        m = INT_RANGE_RE.match(token)
+        if not m:
+            continue
+        first = int(m.group('FIRST'))
+        last = int(m.group('LAST') or first)
+        selection.update(range(min(first, last), max(first, last) + 1))
     return selection
 
 
@@ -188,6 +189,9 @@ def arg_parse():
     parser.add_argument(
         '-o', '--overwrite', default=False, action='store_true',
         help='Force overwrite of existing files')
+    parser.add_argument(
+        '--threads', default=3, type=int,
+        help='Number of files to download concurrently')
     parser.add_argument(
         '-d', '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -205,4 +209,5 @@ if __name__ == '__main__':
 
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
-    main(csv_folder=args.csv, years=args.years, overwrite_flag=args.overwrite)
+    main(csv_folder=args.csv, years=args.years, overwrite_flag=args.overwrite,
+         threads=args.threads)
@@ -1,15 +1,101 @@
 import argparse
+from concurrent import futures
 import logging
 import os
 import pprint
+import queue
 import re
 import sys
+import threading
 
+import numpy as np
 import pandas as pd
 
+WRS2_TILE_RE = re.compile(r'p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+INT_RANGE_RE = re.compile(r'\s*(?P<FIRST>\d+)\s*(?:-\s*(?P<LAST>\d+)\s*)?$')
+
+# Input fields (default values in bulk metadata CSV file)
+ACQ_DATE_COL = 'acquisitionDate'
+BROWSE_URL_COL = 'browseURL'
+CLOUD_COL = 'CLOUD_COVER_LAND'
+COL_NUMBER_COL = 'COLLECTION_NUMBER'
+COL_CATEGORY_COL = 'COLLECTION_CATEGORY'
+PRODUCT_ID_COL = 'LANDSAT_PRODUCT_ID'
+SCENE_ID_COL = 'sceneID'
+SENSOR_COL = 'sensor'
+TIME_COL = 'sceneStartTime'
+DATA_TYPE_COL = 'DATA_TYPE_L1'
+WRS2_PATH_COL = 'path'
+WRS2_ROW_COL = 'row'
+
+# Output fieldnames (matches metadata_csv_api.py and newer style formatting)
+ACQ_DATE_COL_OUT = 'ACQUISITION_DATE'
+BROWSE_URL_COL_OUT = 'BROWSE_REFLECTIVE_PATH'
+CLOUD_COL_OUT = 'CLOUD_COVER_LAND'
+COL_NUMBER_COL_OUT = 'COLLECTION_NUMBER'
+COL_CATEGORY_COL_OUT = 'COLLECTION_CATEGORY'
+PRODUCT_ID_COL_OUT = 'LANDSAT_PRODUCT_ID'
+SCENE_ID_COL_OUT = 'LANDSAT_SCENE_ID'
+SENSOR_COL_OUT = 'SENSOR'
+TIME_COL_OUT = 'SCENE_START_TIME'
+DATA_TYPE_COL_OUT = 'DATA_TYPE_L1'
+WRS2_PATH_COL_OUT = 'WRS_PATH'
+WRS2_ROW_COL_OUT = 'WRS_ROW'
+
+# Generated fields
+WRS2_TILE_COL = 'WRS2_TILE'
+
+# Field rename mapping
+USE_COLS = [
+    [ACQ_DATE_COL, ACQ_DATE_COL_OUT],
+    [BROWSE_URL_COL, BROWSE_URL_COL_OUT],
+    [CLOUD_COL, CLOUD_COL_OUT],
+    [COL_CATEGORY_COL, COL_CATEGORY_COL_OUT],
+    [COL_NUMBER_COL, COL_NUMBER_COL_OUT],
+    [DATA_TYPE_COL, DATA_TYPE_COL_OUT],
+    [PRODUCT_ID_COL, PRODUCT_ID_COL_OUT],
+    [SCENE_ID_COL, SCENE_ID_COL_OUT],
+    [SENSOR_COL, SENSOR_COL_OUT],
+    [TIME_COL, TIME_COL_OUT],
+    [WRS2_PATH_COL, WRS2_PATH_COL_OUT],
+    [WRS2_ROW_COL, WRS2_ROW_COL_OUT],
+]
+
+# Rename all of the input fields in a single rename() call
+RENAME_COLS = dict(USE_COLS)
+
+# Field data types
+# Built once at import and passed to every read_csv() call to skip the
+#   type inference
+# Path/row values fit in int16 and the low cardinality string fields
+#   are stored as categories to keep the chunks small
+DTYPE_COLS = {
+    ACQ_DATE_COL: str,
+    BROWSE_URL_COL: str,
+    COL_CATEGORY_COL: 'category',
+    DATA_TYPE_COL: 'category',
+    PRODUCT_ID_COL: str,
+    SCENE_ID_COL: str,
+    SENSOR_COL: 'category',
+    TIME_COL: str,
+    WRS2_PATH_COL: 'int16',
+    WRS2_ROW_COL: 'int16',
+}
+# Previously filtered CSV files will have the output fieldnames
+DTYPE_COLS.update({
+    output_col: DTYPE_COLS[input_col]
+    for input_col, output_col in USE_COLS if input_col in DTYPE_COLS})
+
+# Only parse the fields that will be written to the output CSV
+# Previously filtered CSV files will have the output fieldnames
+READ_COLS = set([x[0] for x in USE_COLS] + [x[1] for x in USE_COLS])
+
+# Output fields (ordered to match metadata_csv_api.py)
+OUTPUT_COLS = [x[1] for x in USE_COLS] + [WRS2_TILE_COL]
+
 
 def main(csv_folder, wrs2_tiles=None, years=None, months=None,
-         conus_flag=False):
+         conus_flag=False, processes=3, sort_flag=True):
     """Filter Landsat Collection 1 bulk metadata CSV files
 
     Parameters
@@ -31,6 +117,11 @@ def main(csv_folder, wrs2_tiles=None, years=None, months=None,
     conus_flag : bool, optional
         If True, remove all non-CONUS entries.
         Remove path < 10, path > 48, row < 25 or row > 43.
+    processes : int, optional
+        Number of CSV files to filter in parallel (the default is 3).
+    sort_flag : bool, optional
+        If True (the default), sort the filtered values by WRS2 tile and
+        acquisition date.  If False, the values are written in file order.
 
     Notes
     -----
@@ -69,174 +160,354 @@ def main(csv_folder, wrs2_tiles=None, years=None, months=None,
         'LANDSAT_ETM_C1.csv',
         'LANDSAT_TM_C1.csv',
     ]
+    # First and last year of data in each CSV file
     csv_years = {
-        'LANDSAT_8_C1.csv': set(range(2013, 2099)),
-        'LANDSAT_ETM_C1.csv': set(range(1999, 2099)),
-        'LANDSAT_TM_C1.csv': set(range(1984, 2012)),
+        'LANDSAT_8_C1.csv': (2013, 2098),
+        'LANDSAT_ETM_C1.csv': (1999, 2098),
+        'LANDSAT_TM_C1.csv': (1984, 2011),
     }
 
-    # Input fields (default values in bulk metadata CSV file)
-    acq_date_col = 'acquisitionDate'
-    browse_url_col = 'browseURL'
-    cloud_col = 'CLOUD_COVER_LAND'
-    col_number_col = 'COLLECTION_NUMBER'
-    col_category_col = 'COLLECTION_CATEGORY'
-    product_id_col = 'LANDSAT_PRODUCT_ID'
-    scene_id_col = 'sceneID'
-    sensor_col = 'sensor'
-    time_col = 'sceneStartTime'
-    data_type_col = 'DATA_TYPE_L1'
-    wrs2_path_col = 'path'
-    wrs2_row_col = 'row'
-
-    # Output fieldnames (matches metadata_csv_api.py and newer style formatting)
-    acq_date_col_out = 'ACQUISITION_DATE'
-    browse_url_col_out = 'BROWSE_REFLECTIVE_PATH'
-    cloud_col_out = 'CLOUD_COVER_LAND'
-    col_number_col_out = 'COLLECTION_NUMBER'
-    col_category_col_out = 'COLLECTION_CATEGORY'
-    product_id_col_out = 'LANDSAT_PRODUCT_ID'
-    scene_id_col_out = 'LANDSAT_SCENE_ID'
-    sensor_col_out = 'SENSOR'
-    time_col_out = 'SCENE_START_TIME'
-    data_type_col_out = 'DATA_TYPE_L1'
-    wrs2_path_col_out = 'WRS_PATH'
-    wrs2_row_col_out = 'WRS_ROW'
-
-    # Generated fields
-    wrs2_tile_col = 'WRS2_TILE'
-
-    # Field rename mapping
-    use_cols = [
-        [acq_date_col, acq_date_col_out],
-        [browse_url_col, browse_url_col_out],
-        [cloud_col, cloud_col_out],
-        [col_category_col, col_category_col_out],
-        [col_number_col, col_number_col_out],
-        [data_type_col, data_type_col_out],
-        [product_id_col, product_id_col_out],
-        [scene_id_col, scene_id_col_out],
-        [sensor_col, sensor_col_out],
-        [time_col, time_col_out],
-        [wrs2_path_col, wrs2_path_col_out],
-        [wrs2_row_col, wrs2_row_col_out],
-    ]
-
     # Setup and validate the path/row lists
     wrs2_tile_list, path_list, row_list = check_wrs2_tiles(
         wrs2_tile_list, path_list, row_list)
 
-    # Process each CSV
+    # Build the list of CSV files to filter
+    csv_path_list = []
     for csv_name in csv_file_list:
         csv_path = os.path.join(csv_folder, csv_name)
         logging.info('{}'.format(csv_name))
         logging.debug('  {}'.format(os.path.join(csv_folder, csv_name)))
 
-        if year_list and not csv_years[csv_name].intersection(set(year_list)):
+        # The year lists are sorted, so compare against the range endpoints
+        if year_list and (year_list[-1] < csv_years[csv_name][0] or
+                          year_list[0] > csv_years[csv_name][1]):
             logging.info('  No data for target year(s), skipping file')
             # logging.info('  No data for target year(s), removing file')
             # os.remove(csv_path)
             continue
         elif not os.path.isfile(csv_path):
             logging.info('  The CSV file does not exist, skipping')
+            continue
+        csv_path_list.append(csv_path)
+
+    # The CSV files are independent, so filter each one in a separate process
+    loglevel = logging.getLogger().getEffectiveLevel()
+    with futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        future_list = [
+            executor.submit(filter_csv, csv_path, wrs2_tile_list, path_list,
+                            row_list, year_list, month_list, loglevel,
+                            sort_flag)
+            for csv_path in csv_path_list]
+        for future in futures.as_completed(future_list):
+            future.result()
+
+
+def filter_csv(csv_path, wrs2_tile_list=[], path_list=[], row_list=[],
+               year_list=[], month_list=[], loglevel=logging.INFO,
+               sort_flag=True):
+    """Filter a single Landsat bulk metadata CSV file
+
+    Parameters
+    ----------
+    csv_path : str
+        File path of the Landsat bulk metadata CSV file.
+    wrs2_tile_list : list, optional
+        Landsat WRS2 tiles (path/rows) to include.
+    path_list : list, optional
+        Landsat WRS2 paths to include.
+    row_list : list, optional
+        Landsat WRS2 rows to include.
+    year_list : list, optional
+        Years to include.
+    month_list : list, optional
+        Months to include.
+    loglevel : int, optional
+        Logging level for the worker process.
+    sort_flag : bool, optional
+        If True (the default), sort the filtered values by WRS2 tile and
+        acquisition date.
+
+    Notes
+    -----
+    The file is overwritten with the filtered values.
+    This function is called in a separate process by main(), so all of the
+        parameters need to be picklable.
+
+    """
+    # Logging is not inherited by spawned (non-fork) worker processes
+    # basicConfig() does nothing if the root logger is already configured
+    logging.basicConfig(level=loglevel, format='%(message)s')
+
+    # Convert the filter lists to arrays once instead of for every chunk
+    # WRS2 paths/rows (< 1000) and months are small non-negative integers,
+    #   so use boolean lookup tables that are indexed directly by value
+    # The path/row lists were checked against the table size in
+    #   check_wrs2_tiles() and out of range CSV values never match
+    path_lookup = np.zeros(1000, dtype=bool)
+    path_lookup[path_list] = True
+    row_lookup = np.zeros(1000, dtype=bool)
+    row_lookup[row_list] = True
+    month_lookup = np.zeros(13, dtype=bool)
+    month_lookup[[m for m in month_list if 1 <= m <= 12]] = True
+    year_array = np.array(year_list, dtype=np.int16)
+    # Filter the WRS2 tiles on integer path * 1000 + row keys so the tile
+    #   strings only need to be built for the rows that are kept
+    # The tiles were already zero padded in check_wrs2_tiles()
+    wrs2_key_array = np.array(
+        [int(pr[1:4]) * 1000 + int(pr[5:8]) for pr in wrs2_tile_list],
+        dtype=np.int32)
+
+    # The separate path and row filters are enough if the tile list is
+    #   every combination of the paths and rows, so skip the tile filter
+    wrs2_tile_flag = bool(wrs2_tile_list) and set(wrs2_tile_list) != set([
+        'p{:03d}r{:03d}'.format(path, row)
+        for path in path_list for row in row_list])
+
+    # Read the header once so the parser can be given the exact fields
+    #   to keep instead of testing each field name with a callable
+    header_cols = pd.read_csv(csv_path, nrows=0).columns
+    input_cols = [x for x in header_cols if x in READ_COLS]
+    missing_cols = [
+        output_col for input_col, output_col in USE_COLS
+        if input_col not in input_cols and output_col not in input_cols]
+    if missing_cols:
+        logging.error(
+            '\nERROR: {} is missing the fields: {}\n  Skipping file'.format(
+                os.path.basename(csv_path), ', '.join(missing_cols)))
+        return
 
-        # Process the CSVs in chunks to limit the memory usage
-        logging.info('  Filtering by chunk')
-        temp_path = csv_path.replace('.csv', '_filter.csv')
-        append_flag = False
-        for input_df in pd.read_csv(csv_path, chunksize=1 << 16):
+    # Process the CSVs in chunks to limit the memory usage
+    logging.info('{}: filtering by chunk'.format(os.path.basename(csv_path)))
+    # Log the filters once instead of for every chunk
+    if path_list:
+        logging.debug('  Filtering by path')
+    if row_list:
+        logging.debug('  Filtering by row')
+    if year_list:
+        logging.debug('  Filtering by year')
+    if month_list:
+        logging.debug('  Filtering by month')
+    if wrs2_tile_flag:
+        logging.debug('  Filtering by path/row')
+    temp_path = csv_path.replace('.csv', '_filter.csv')
+    temp_f = None
+    output_list = []
+    chunksize = get_chunksize(csv_path)
+    logging.debug('  Chunk size: {}'.format(chunksize))
+    input_chunks = read_csv_chunks(csv_path, input_cols, chunksize)
+    try:
+        for input_df in input_chunks:
             logging.debug('\n  Scene count: {}'.format(len(input_df)))
 
             # Rename fields before filtering
-            for input_col, output_col in use_cols:
-                if input_col in input_df.columns:
-                    input_df.rename(columns={input_col: output_col},
-                                    inplace=True)
-
-            # Manually convert date string to datetime
-            # Can't use parse_dates in read_csv() since we are not sure which
-            #   field is present.
-            if acq_date_col in input_df.columns:
-                input_df[acq_date_col] = pd.to_datetime(
-                    input_df[acq_date_col], infer_datetime_format=True)
-            if acq_date_col_out in input_df.columns:
-                input_df[acq_date_col_out] = pd.to_datetime(
-                    input_df[acq_date_col_out], infer_datetime_format=True)
+            # Fields that already have the output name are left unchanged
+            input_df.rename(columns=RENAME_COLS, inplace=True)
+
+            # Combine all of the filters into a single mask so the dataframe
+            #   is only sliced once per chunk
+            # All of the output fields are required, so don't check for
+            #   each one
+            wrs2_paths = input_df[WRS2_PATH_COL_OUT].values
+            wrs2_rows = input_df[WRS2_ROW_COL_OUT].values
 
             # Remove high latitude rows
-            if wrs2_row_col_out in input_df.columns:
-                input_df = input_df[input_df[wrs2_row_col_out] < 100]
-                input_df = input_df[input_df[wrs2_row_col_out] > 9]
-                logging.debug('  Scene count: {}'.format(len(input_df)))
+            # Compare on the numpy array to skip the pandas Series overhead
+            mask = (wrs2_rows < 100) & (wrs2_rows > 9)
 
             # Filter by path and row separately
-            if path_list and wrs2_path_col_out in input_df.columns:
-                logging.debug('  Filtering by path')
-                input_df = input_df[input_df[wrs2_path_col_out] <= max(path_list)]
-                input_df = input_df[input_df[wrs2_path_col_out] >= min(path_list)]
-                input_df = input_df[input_df[wrs2_path_col_out].isin(path_list)]
-            if row_list and wrs2_row_col_out in input_df.columns:
-                logging.debug('  Filtering by row')
-                input_df = input_df[input_df[wrs2_row_col_out] <= max(row_list)]
-                input_df = input_df[input_df[wrs2_row_col_out] >= min(row_list)]
-                input_df = input_df[input_df[wrs2_row_col_out].isin(row_list)]
-
-            # Filter by WRS2 tile list (apply call raises exception on empty df)
+            if path_list:
+                mask &= lookup_mask(path_lookup, wrs2_paths)
+            if row_list:
+                mask &= lookup_mask(row_lookup, wrs2_rows)
+
+            # Parse the acquisition dates so they are always written out as
+            #   YYYY-MM-DD, even if the bulk file uses another format
+            # Try the fixed format first since it skips the format inference,
+            #   then fall back to inferring it (i.e. 1999/01/12)
+            # Dates that can't be parsed are set to NaT
+            try:
+                acq_dates = pd.to_datetime(
+                    input_df[ACQ_DATE_COL_OUT], format='%Y-%m-%d', cache=True)
+            except ValueError:
+                acq_dates = pd.to_datetime(
+                    input_df[ACQ_DATE_COL_OUT], errors='coerce', cache=True)
+            input_df[ACQ_DATE_COL_OUT] = acq_dates
+
+            # Compute the year and month with integer arithmetic on the
+            #   datetime64 values instead of through the .dt accessors
+            # NaT dates are dropped, matching the .dt.year/.dt.month filters
+            if year_list or month_list:
+                acq_months = acq_dates.values.astype('datetime64[M]')
+                mask &= ~np.isnat(acq_months)
+                acq_months = acq_months.astype(np.int64)
+
+            # Filter by year and skip early/late months
+            if year_list:
+                mask &= np.isin(acq_months // 12 + 1970, year_array)
+            if month_list:
+                mask &= month_lookup[acq_months % 12 + 1]
+
+            # Filter by WRS2 tile list
+            if wrs2_tile_flag:
+                wrs2_keys = wrs2_paths.astype(np.int32) * 1000 + wrs2_rows
+                mask &= np.isin(wrs2_keys, wrs2_key_array)
+
+            # take() returns a copy of the kept rows, so the chunk can be freed
+            input_df = input_df.take(np.flatnonzero(mask))
+            # The path/row arrays are views of the full chunk, so release them
+            #   (and the full length date and mask arrays) to let the chunk be
+            #   freed once the next chunk is requested
+            del mask, wrs2_paths, wrs2_rows, acq_dates
+            logging.debug('  Scene count: {}'.format(len(input_df)))
             if input_df.empty:
                 logging.debug('  Empty dataframe, skipping chunk')
                 continue
-            if (wrs2_tile_list and
-                    wrs2_path_col_out in input_df.columns and
-                    wrs2_row_col_out in input_df.columns):
-                logging.debug('  Computing WRS2 tile')
-                try:
-                    input_df[wrs2_tile_col] = input_df[[wrs2_path_col_out,
-                                                        wrs2_row_col_out]]\
-                        .apply(lambda x: 'p{:03d}r{:03d}'.format(x[0], x[1]),
-                               axis=1)
-                except ValueError:
-                    logging.info('  Possible empty DataFrame, skipping file')
-                    continue
-
-                logging.debug('  Filtering by path/row')
-                input_df = input_df[input_df[wrs2_tile_col].isin(wrs2_tile_list)]
-                # input_df.drop(wrs2_tile_col, axis=1, inplace=True)
-
-            # Filter by year
-            if year_list and acq_date_col_out in input_df.columns:
-                input_df = input_df[
-                    input_df[acq_date_col_out].dt.year.isin(year_list)]
-
-            # Skip early/late months
-            if month_list and acq_date_col_out in input_df.columns:
-                logging.debug('  Filtering by month')
-                input_df = input_df[
-                    input_df[acq_date_col_out].dt.month.isin(month_list)]
+
+            # The tile is always needed for the output columns and sorting
+            input_df[WRS2_TILE_COL] = (
+                'p' + input_df[WRS2_PATH_COL_OUT].astype(str).str.zfill(3) +
+                'r' + input_df[WRS2_ROW_COL_OUT].astype(str).str.zfill(3))
 
             # Subset and order columns to match metadata_csv_api.py
-            input_df = input_df[[x[1] for x in use_cols] + [wrs2_tile_col]]
-            if input_df.empty:
-                logging.debug('  Empty dataframe, skipping chunk')
-                continue
+            input_df = input_df[OUTPUT_COLS]
 
-            # Write dataframe to csv
-            logging.debug('  Saving')
-            if append_flag:
-                input_df.to_csv(temp_path, mode='a', index=False, header=False)
+            if sort_flag:
+                # Keep the filtered chunks in memory instead of writing them to
+                #   an intermediate CSV that has to be parsed again for sorting
+                output_list.append(input_df)
             else:
-                input_df.to_csv(temp_path, mode='w', index=False, header=True)
-                append_flag = True
+                # Without sorting, the chunks can be written directly to the
+                #   temp file and don't need to be kept in memory
+                # Keep the temp file open instead of reopening it for every
+                #   chunk
+                if temp_f is None:
+                    temp_f = open(temp_path, 'w', newline='')
+                    input_df.to_csv(temp_f, index=False)
+                else:
+                    input_df.to_csv(temp_f, index=False, header=False)
 
         # Overwrite metadata csv with filter csv
-        if os.path.isfile(temp_path):
-            input_df = pd.read_csv(temp_path)
-            input_df.sort_values(by=[wrs2_tile_col, acq_date_col_out],
-                                 inplace=True)
-            input_df.to_csv(csv_path, index=False)
-            del input_df
-            os.remove(temp_path)
+        # Write the values to the temp file and then replace the metadata csv
+        #   so a failed write can't corrupt the original file
+        # The temp file is in the same folder so the replace is a rename
+        if not sort_flag:
+            if temp_f is not None:
+                logging.debug('  Saving')
+                temp_f.close()
+                os.replace(temp_path, csv_path)
+    finally:
+        # Stop the background reader right away if filtering failed
+        input_chunks.close()
+        # Don't leave an open handle or a partial temp file behind if
+        #   filtering or writing the unsorted chunks failed
+        if temp_f is not None:
+            temp_f.close()
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    if sort_flag and output_list:
+        logging.debug('  Saving')
+        output_df = pd.concat(output_list)
+        del output_list
+        output_df.sort_values(by=[WRS2_TILE_COL, ACQ_DATE_COL_OUT],
+                              inplace=True)
+        try:
+            output_df.to_csv(temp_path, index=False)
+            os.replace(temp_path, csv_path)
+        finally:
+            # Don't leave a partial temp file behind if the write failed
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+
+def lookup_mask(lookup, values):
+    """Return a mask of the values that are set in a boolean lookup table
+
+    Values outside of the lookup table (i.e. negative) are never matched.
+
+    """
+    valid = (values >= 0) & (values < len(lookup))
+    return valid & lookup[np.where(valid, values, 0)]
+
 
-            # shutil.move(temp_path, csv_path)
+def get_chunksize(csv_path, chunk_bytes=1 << 26, min_rows=1 << 13,
+                  max_rows=1 << 16):
+    """Estimate the number of CSV rows per chunk from the file row length
+
+    The unfiltered bulk metadata rows have many more fields than the
+        filtered rows, so this limits the raw text tokenized per chunk.
+    Only the output fields are kept in memory for either file, so the row
+        count is capped at the previous fixed chunk size.
+
+    """
+    with open(csv_path, 'rb') as csv_f:
+        sample = csv_f.read(1 << 20)
+    row_bytes = float(len(sample)) / max(sample.count(b'\n'), 1)
+    return int(max(min_rows, min(max_rows, chunk_bytes // max(row_bytes, 1))))
+
+
+def read_csv_chunks(csv_path, input_cols, chunksize=1 << 16, queue_size=2):
+    """Yield metadata CSV chunks that are read in a background thread
+
+    Only the input_cols fields are parsed, with the types in DTYPE_COLS.
+
+    The pandas C parser releases the GIL while tokenizing, so the next chunk
+        can be parsed while the current chunk is being filtered.
+    The queue is bounded to limit the number of chunks held in memory.
+
+    """
+    chunk_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+
+    def put_item(item):
+        # Wait for room in the queue, but give up if the consumer stopped
+        while not stop_event.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_chunks():
+        try:
+            # Map the file into memory instead of copying it through
+            #   the parser's read buffer
+            # low_memory is not set since the dtypes are already given
+            with pd.read_csv(csv_path, dtype=DTYPE_COLS, usecols=input_cols,
+                             chunksize=chunksize,
+                             memory_map=True) as csv_reader:
+                for input_df in csv_reader:
+                    if not put_item(input_df):
+                        return
+                    # Don't hold the chunk while the next one is being parsed
+                    del input_df
+        except Exception as e:
+            # Pass the exception to the consuming thread
+            put_item(e)
+        put_item(None)
+
+    reader = threading.Thread(target=read_chunks)
+    reader.daemon = True
+    reader.start()
+
+    try:
+        while True:
+            item = chunk_queue.get()
+            if item is None:
+                break
+            elif isinstance(item, Exception):
+                raise item
+            yield item
+            # Release the chunk before waiting for the next one
+            del item
+    finally:
+        # Stop the reader if the consumer failed or stopped early and
+        #   release any chunks that are still queued
+        stop_event.set()
+        reader.join()
+        while not chunk_queue.empty():
+            chunk_queue.get_nowait()
 
 
 def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
@@ -246,15 +517,22 @@ def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
     Filtering by path and row lists separately seems to be faster than
         creating a new path/row field and filtering directly
     """
+    # Nothing to check if no WRS2 filtering was requested
+    if not wrs2_tile_list and not path_list and not row_list:
+        return [], [], []
+
     wrs2_tile_fmt = 'p{:03d}r{:03d}'
-    wrs2_tile_re = re.compile('p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+
+    # Match each tile once and keep the integer path/row pairs
+    wrs2_tile_pairs = [
+        (int(m.group('PATH')), int(m.group('ROW')))
+        for pr in wrs2_tile_list
+        for m in [WRS2_TILE_RE.match(pr)] if m]
 
     # Force path/row list to zero padded three digit numbers
     if wrs2_tile_list:
         wrs2_tile_list = sorted([
-            wrs2_tile_fmt.format(int(m.group('PATH')), int(m.group('ROW')))
-            for pr in wrs2_tile_list
-            for m in [wrs2_tile_re.match(pr)] if m])
+            wrs2_tile_fmt.format(path, row) for path, row in wrs2_tile_pairs])
 
     # If path_list and row_list were specified, force to integer type
     # Declare variable as an empty list if it does not exist
@@ -272,18 +550,24 @@ def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
             '\nERROR: The row list could not be converted to integers, '
             'exiting\n  {}'.format(row_list))
         sys.exit()
+    # The filters use lookup tables that only cover three digit values
+    if any(not 0 <= x < 1000 for x in path_list):
+        logging.error(
+            '\nERROR: The paths must be between 0 and 999, '
+            'exiting\n  {}'.format(path_list))
+        sys.exit()
+    if any(not 0 <= x < 1000 for x in row_list):
+        logging.error(
+            '\nERROR: The rows must be between 0 and 999, '
+            'exiting\n  {}'.format(row_list))
+        sys.exit()
 
     # Convert wrs2_tile_list to path_list and row_list if not set
     # Pre-filtering on path and row separately is faster than building wrs2_tile
-    # This is a pretty messy way of doing this...
     if wrs2_tile_list and not path_list:
-        path_list = sorted(list(set([
-            int(wrs2_tile_re.match(pr).group('PATH'))
-            for pr in wrs2_tile_list if wrs2_tile_re.match(pr)])))
+        path_list = sorted(set([path for path, row in wrs2_tile_pairs]))
     if wrs2_tile_list and not row_list:
-        row_list = sorted(list(set([
-            int(wrs2_tile_re.match(pr).group('ROW'))
-            for pr in wrs2_tile_list if wrs2_tile_re.match(pr)])))
+        row_list = sorted(set([row for path, row in wrs2_tile_pairs]))
     if path_list:
         logging.debug('  Paths: {}'.format(
             ' '.join(list(map(str, path_list)))))
@@ -303,36 +587,31 @@ def is_valid_folder(parser, arg):
         return arg
 
 
+def is_positive_int(parser, arg):
+    try:
+        value = int(arg)
+    except ValueError:
+        parser.error('The value {} is not an integer!'.format(arg))
+    if value < 1:
+        parser.error('The value {} must be at least 1!'.format(arg))
+    return value
+
+
 def parse_int_set(nputstr=""):
     """Return list of numbers given a string of ranges
 
     http://thoughtsbyclayg.blogspot.com/2008/10/parsing-list-of-numbers-in-python.html
     """
     selection = set()
-    invalid = set()
-    # tokens are comma separated values
-    tokens = [x.strip() for x in nputstr.split(',')]
-    for i in tokens:
-        try:
-            # typically tokens are plain old integers
-            selection.add(int(i))
-        except:
-            # if not, then it might be a range
-            try:
-                token = [int(k.strip()) for k in i.split('-')]
-                if len(token) > 1:
-                    token.sort()
-                    # we have items separated by a dash
-                    # try to build a valid range
-                    first = token[0]
-                    last = token[len(token) - 1]
-                    for x in range(first, last + 1):
-                        selection.add(x)
-            except:
-                # not an int and not a range...
-                invalid.add(i)
-    # Report invalid tokens before returning valid selection
-    # print "Invalid set: " + str(invalid)
+    # tokens are comma separated values or ranges
+    # Tokens that are not an int or a range are skipped
+    for token in nputstr.split(','):
+        m = INT_RANGE_RE.match(token)
+        if not m:
+            continue
+        first = int(m.group('FIRST'))
+        last = int(m.group('LAST') or first)
+        selection.update(range(min(first, last), max(first, last) + 1))
     return selection
 
 
@@ -360,6 +639,13 @@ def arg_parse():
     parser.add_argument(
         '--conus', default=False, action='store_true',
         help='Filter CSV files to only CONUS Landsat images/tiles')
+    parser.add_argument(
+        '--processes', default=3,
+        type=lambda x: is_positive_int(parser, x),
+        help='Number of CSV files to filter in parallel')
+    parser.add_argument(
+        '--no-sort', default=True, action='store_false', dest='sort_flag',
+        help='Write the filtered values in file order without sorting')
     parser.add_argument(
         '-d', '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -378,4 +664,5 @@ if __name__ == '__main__':
     logging.basicConfig(level=args.loglevel, format='%(message)s')
 
     main(csv_folder=args.csv, wrs2_tiles=args.wrs2,
-         years=args.years, months=args.months, conus_flag=args.conus)
+         years=args.years, months=args.months, conus_flag=args.conus,
+         processes=args.processes, sort_flag=args.sort_flag)
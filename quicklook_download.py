@@ -1,15 +1,21 @@
 import argparse
+from concurrent import futures
 import logging
 import os
 import re
 import sys
 
+import numpy as np
 import pandas as pd
 import requests
 
+WRS2_TILE_RE = re.compile(r'p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+INT_RANGE_RE = re.compile(r'\s*(?P<FIRST>\d+)\s*(?:-\s*(?P<LAST>\d+)\s*)?$')
+
 
 def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
-         skip_list_path=None, overwrite_flag=False, id_type='product'):
+         skip_list_path=None, overwrite_flag=False, id_type='product',
+         threads=4):
     """Download Landsat Collection 1 quicklook images
 
     Parameters
@@ -36,6 +42,8 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
         If True, overwrite existing files (the default is False).
     id_type : str, optional
         Landsat ID type (the default is 'product').
+    threads : int, optional
+        Number of quicklooks to download concurrently (the default is 4).
 
     Returns
     -------
@@ -73,14 +81,13 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
         'LANDSAT_ETM_C1.csv',
         'LANDSAT_TM_C1.csv',
     ]
+    # First and last year of data in each CSV file
     csv_years = {
-        'LANDSAT_8_C1.csv': set(range(2013, 2099)),
-        'LANDSAT_ETM_C1.csv': set(range(1999, 2099)),
-        'LANDSAT_TM_C1.csv': set(range(1984, 2012)),
+        'LANDSAT_8_C1.csv': (2013, 2098),
+        'LANDSAT_ETM_C1.csv': (1999, 2098),
+        'LANDSAT_TM_C1.csv': (1984, 2011),
     }
 
-    wrs2_tile_fmt = 'p{:03d}r{:03d}'
-
     # Input fields
     acq_date_col = 'ACQUISITION_DATE'
     browse_url_col = 'BROWSE_REFLECTIVE_PATH'
@@ -99,6 +106,20 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
         data_type_col, product_id_col, scene_id_col, wrs2_path_col,
         wrs2_row_col, wrs2_tile_col]
 
+    # Field data types
+    # Path/row values fit in int16 and the low cardinality string fields
+    #   are stored as categories
+    dtype_cols = {
+        browse_url_col: str,
+        col_category_col: 'category',
+        data_type_col: 'category',
+        product_id_col: str,
+        scene_id_col: str,
+        wrs2_path_col: 'int16',
+        wrs2_row_col: 'int16',
+        wrs2_tile_col: str,
+    }
+
     # All other data types and categories will be written to cloudy folder
     # DEADBEEF Should OLI_L1TP (no TIRS) be included in clear images?
     data_types = ['OLI_TIRS_L1TP', 'OLI_L1TP', 'ETM_L1TP', 'TM_L1TP', 'L1TP']
@@ -123,12 +144,29 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
             skip_list_path))
         sys.exit()
 
+    # Convert the filter lists to arrays once instead of for every file
+    # WRS2 paths/rows (< 1000) and months are small non-negative integers,
+    #   so use boolean lookup tables that are indexed directly by value
+    # The path/row lists were checked against the table size in
+    #   check_wrs2_tiles() and out of range CSV values never match
+    path_lookup = np.zeros(1000, dtype=bool)
+    path_lookup[path_list] = True
+    row_lookup = np.zeros(1000, dtype=bool)
+    row_lookup[row_list] = True
+    month_lookup = np.zeros(13, dtype=bool)
+    month_lookup[[m for m in month_list if 1 <= m <= 12]] = True
+    year_array = np.array(year_list, dtype=np.int16)
+    # The tiles were already zero padded in check_wrs2_tiles()
+    wrs2_key_array = np.array(
+        [int(pr[1:4]) * 1000 + int(pr[5:8]) for pr in wrs2_tile_list],
+        dtype=np.int32)
+
     # Read in skip list
-    skip_list = []
+    # Use a set since every scene is checked against the skip list
+    skip_list = set()
     if skip_list_path:
         with open(skip_list_path, 'r') as skip_f:
-            skip_list = skip_f.readlines()
-            skip_list = [item.strip() for item in skip_list]
+            skip_list = set([item.strip() for item in skip_f.readlines()])
 
     logging.info('\nReading metadata CSV files')
     download_list = []
@@ -136,7 +174,9 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
         logging.info('{}'.format(csv_name))
         csv_path = os.path.join(csv_folder, csv_name)
 
-        if year_list and not csv_years[csv_name].intersection(set(year_list)):
+        # The year lists are sorted, so compare against the range endpoints
+        if year_list and (year_list[-1] < csv_years[csv_name][0] or
+                          year_list[0] > csv_years[csv_name][1]):
             logging.info('  No data for target year(s), skipping file')
             continue
         elif not os.path.isfile(csv_path):
@@ -144,7 +184,7 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
 
         try:
             input_df = pd.read_csv(
-                csv_path, usecols=input_cols, parse_dates=[acq_date_col])
+                csv_path, usecols=input_cols, dtype=dtype_cols)
         except Exception as e:
             logging.warning('  The CSV file could not be read, skipping')
             logging.debug('  Exception: {}'.format(e))
@@ -152,44 +192,65 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
         if input_df.empty:
             logging.debug('  Empty DataFrame, skipping file')
             continue
+
+        # Convert the dates with an explicit format instead of parse_dates,
+        #   which has to infer the format of each value
+        # Dates that can't be parsed are set to NaT and dropped below
+        input_df[acq_date_col] = pd.to_datetime(
+            input_df[acq_date_col], format='%Y-%m-%d', errors='coerce',
+            cache=True)
         # logging.debug(input_df.head())
         logging.debug('  Fields: {}'.format(', '.join(input_df.columns.values)))
         logging.debug('  Initial scene count: {}'.format(len(input_df)))
 
+        # Combine the path, row, year, and month filters into a single mask
+        #   so the dataframe is only sliced once
+        # Skip scenes without a valid acquisition date
+        mask = input_df[acq_date_col].notna().values
+
         # Filter scenes first by path and row separately
         if path_list:
             logging.debug('  Filtering by path')
-            input_df = input_df[input_df[wrs2_path_col] <= max(path_list)]
-            input_df = input_df[input_df[wrs2_path_col] >= min(path_list)]
-            input_df = input_df[input_df[wrs2_path_col].isin(path_list)]
+            mask &= lookup_mask(path_lookup, input_df[wrs2_path_col].values)
         if row_list:
             logging.debug('  Filtering by row')
-            input_df = input_df[input_df[wrs2_row_col] <= max(row_list)]
-            input_df = input_df[input_df[wrs2_row_col] >= min(row_list)]
-            input_df = input_df[input_df[wrs2_row_col].isin(row_list)]
+            mask &= lookup_mask(row_lookup, input_df[wrs2_row_col].values)
 
-        # Then filter by path/row combined
-        # DEADBEEF - WRS2_TILE should already be in the file
-        try:
-            input_df[wrs2_tile_col] = input_df[[wrs2_path_col, wrs2_row_col]] \
-                .apply(lambda x: wrs2_tile_fmt.format(x[0], x[1]), axis=1)
-        except ValueError:
-            logging.info('  Possible empty DataFrame, skipping file')
-            continue
-        if wrs2_tile_list:
-            logging.debug('  Filtering by path/row')
-            input_df = input_df[input_df[wrs2_tile_col].isin(wrs2_tile_list)]
+        # Compute the year and month arrays directly from the datetime64
+        #   values instead of through the .dt accessors
+        if year_list or month_list:
+            acq_months = input_df[acq_date_col].values.astype(
+                'datetime64[M]').astype(np.int64)
 
         # Filter by year
         if year_list:
             logging.debug('  Filtering by year')
-            input_df = input_df[input_df[acq_date_col].dt.year.isin(year_list)]
+            mask &= np.isin(acq_months // 12 + 1970, year_array)
 
         # Skip early/late months
         if month_list:
             logging.debug('  Filtering by month')
-            input_df = input_df[
-                input_df[acq_date_col].dt.month.isin(month_list)]
+            mask &= month_lookup[acq_months % 12 + 1]
+
+        # Then filter by path/row combined
+        if wrs2_tile_list:
+            logging.debug('  Filtering by path/row')
+            wrs2_keys = (
+                input_df[wrs2_path_col].values.astype(np.int32) * 1000 +
+                input_df[wrs2_row_col].values)
+            mask &= np.isin(wrs2_keys, wrs2_key_array)
+
+        # Gather the kept rows by index instead of with a boolean slice
+        input_df = input_df.take(np.flatnonzero(mask))
+
+        # DEADBEEF - WRS2_TILE should already be in the file
+        if input_df.empty:
+            logging.info('  Empty DataFrame, skipping file')
+            continue
+        input_df[wrs2_tile_col] = (
+            'p' + input_df[wrs2_path_col].astype(str).str.zfill(3) +
+            'r' + input_df[wrs2_row_col].astype(str).str.zfill(3))
+
         # if start_month:
         #     logging.debug('  Filtering by start month')
         #     input_df = input_df[input_df[date_col].dt.month >= start_month]
@@ -280,35 +341,49 @@ def main(csv_folder, output_folder, wrs2_tiles=None, years=None, months=None,
             download_list.append([image_path, row_df[browse_url_col]])
 
     # Download Landsat Look Images
+    # The downloads are I/O bound, so fetch the images concurrently
+    # Folders are built before submitting to avoid makedirs race conditions
     logging.debug('')
-    for image_path, image_url in sorted(download_list):
-        logging.info('{}'.format(image_path))
-        logging.debug('  {}'.format(image_url))
-        image_folder = os.path.dirname(image_path)
-        if not os.path.isdir(image_folder):
-            os.makedirs(image_folder)
-
-        # Make cloudy image folder also
-        cloud_folder = os.path.join(image_folder, cloud_folder_name)
-        if (os.path.basename(image_folder) != cloud_folder_name and
-                not os.path.isdir(cloud_folder)):
-            os.makedirs(cloud_folder)
-
-        # Trying to catch errors when the bulk metadata site is down
-        download_file(image_url, image_path)
+    with futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        future_list = []
+        for image_path, image_url in sorted(download_list):
+            logging.info('{}'.format(image_path))
+            logging.debug('  {}'.format(image_url))
+            image_folder = os.path.dirname(image_path)
+            if not os.path.isdir(image_folder):
+                os.makedirs(image_folder)
+
+            # Make cloudy image folder also
+            cloud_folder = os.path.join(image_folder, cloud_folder_name)
+            if (os.path.basename(image_folder) != cloud_folder_name and
+                    not os.path.isdir(cloud_folder)):
+                os.makedirs(cloud_folder)
+
+            # Trying to catch errors when the bulk metadata site is down
+            future_list.append(
+                executor.submit(download_file, image_url, image_path))
+        for future in futures.as_completed(future_list):
+            future.result()
 
 
 def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
     """Setup path/row lists"""
+    # Nothing to check if no WRS2 filtering was requested
+    if not wrs2_tile_list and not path_list and not row_list:
+        return [], [], []
+
     wrs2_tile_fmt = 'p{:03d}r{:03d}'
-    wrs2_tile_re = re.compile('p(?P<PATH>\d{1,3})r(?P<ROW>\d{1,3})')
+
+    # Match each tile once and keep the integer path/row pairs
+    wrs2_tile_pairs = [
+        (int(m.group('PATH')), int(m.group('ROW')))
+        for pr in wrs2_tile_list
+        for m in [WRS2_TILE_RE.match(pr)] if m]
 
     # Force path/row list to zero padded three digit numbers
     if wrs2_tile_list:
         wrs2_tile_list = sorted([
-            wrs2_tile_fmt.format(int(m.group('PATH')), int(m.group('ROW')))
-            for wrs2_tile in wrs2_tile_list
-            for m in [wrs2_tile_re.match(wrs2_tile)] if m])
+            wrs2_tile_fmt.format(path, row) for path, row in wrs2_tile_pairs])
 
     # If path_list and row_list were specified, force to integer type
     # Declare variable as an empty list if it does not exist
@@ -326,20 +401,24 @@ def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
             '\nERROR: The row list could not be converted to integers, '
             'exiting\n  {}'.format(row_list))
         sys.exit()
+    # The filters use lookup tables that only cover three digit values
+    if any(not 0 <= x < 1000 for x in path_list):
+        logging.error(
+            '\nERROR: The paths must be between 0 and 999, '
+            'exiting\n  {}'.format(path_list))
+        sys.exit()
+    if any(not 0 <= x < 1000 for x in row_list):
+        logging.error(
+            '\nERROR: The rows must be between 0 and 999, '
+            'exiting\n  {}'.format(row_list))
+        sys.exit()
 
     # Convert wrs2_tile_list to path_list and row_list if not set
     # Pre-filtering on path and row separately is faster than building wrs2_tile
-    # This is a pretty messy way of doing this...
     if wrs2_tile_list and not path_list:
-        path_list = sorted(list(set([
-            int(wrs2_tile_re.match(wrs2_tile).group('PATH'))
-            for wrs2_tile in wrs2_tile_list
-            if wrs2_tile_re.match(wrs2_tile)])))
+        path_list = sorted(set([path for path, row in wrs2_tile_pairs]))
     if wrs2_tile_list and not row_list:
-        row_list = sorted(list(set([
-            int(wrs2_tile_re.match(wrs2_tile).group('ROW'))
-            for wrs2_tile in wrs2_tile_list
-            if wrs2_tile_re.match(wrs2_tile)])))
+        row_list = sorted(set([row for path, row in wrs2_tile_pairs]))
     if path_list:
         logging.debug('  Paths: {}'.format(
             ' '.join(list(map(str, path_list)))))
@@ -352,14 +431,24 @@ def check_wrs2_tiles(wrs2_tile_list=[], path_list=[], row_list=[]):
     return wrs2_tile_list, path_list, row_list
 
 
+def lookup_mask(lookup, values):
+    """Return a mask of the values that are set in a boolean lookup table
+
+    Values outside of the lookup table (i.e. negative) are never matched.
+
+    """
+    valid = (values >= 0) & (values < len(lookup))
+    return valid & lookup[np.where(valid, values, 0)]
+
+
 def download_file(file_url, file_path):
     """"""
     logging.debug('  Downloading file')
     logging.debug('  {}'.format(file_url))
     try:
-        r = requests.get(file_url)
+        r = requests.get(file_url, stream=True)
         with open(file_path, 'wb') as output_f:
-            for chunk in r.iter_content(chunk_size=128):
+            for chunk in r.iter_content(chunk_size=1 << 16):
                 output_f.write(chunk)
     except Exception as e:
         logging.info('  {}\n  Try manually checking the quicklook '
@@ -397,30 +486,15 @@ def parse_int_set(nputstr=""):
     http://thoughtsbyclayg.blogspot.com/2008/10/parsing-list-of-numbers-in-python.html
     """
     selection = set()
-    invalid = set()
-    # tokens are comma separated values
-    tokens = [x.strip() for x in nputstr.split(',')]
-    for i in tokens:
-        try:
-            # typically tokens are plain old integers
-            selection.add(int(i))
-        except:
-            # if not, then it might be a range
-            try:
-                token = [int(k.strip()) for k in i.split('-')]
-                if len(token) > 1:
-                    token.sort()
-                    # we have items separated by a dash
-                    # try to build a valid range
-                    first = token[0]
-                    last = token[len(token) - 1]
-                    for x in range(first, last + 1):
-                        selection.add(x)
-            except:
-                # not an int and not a range...
-                invalid.add(i)
-    # Report invalid tokens before returning valid selection
-    # print "Invalid set: " + str(invalid)
+    # tokens are comma separated values or ranges
+    # Tokens that are not an int or a range are skipped
+    for token in nputstr.split(','):
+        m = INT_RANGE_RE.match(token)
+        if not m:
+            continue
+        first = int(m.group('FIRST'))
+        last = int(m.group('LAST') or first)
+        selection.update(range(min(first, last), max(first, last) + 1))
     return selection
 
 
@@ -460,6 +534,9 @@ def arg_parse():
     parser.add_argument(
         '-o', '--overwrite', default=False, action='store_true',
         help='Overwite existing quicklooks')
+    parser.add_argument(
+        '--threads', default=4, type=int,
+        help='Number of quicklooks to download concurrently')
     parser.add_argument(
         '-d', '--debug', default=logging.INFO, const=logging.DEBUG,
         help='Debug level logging', action='store_const', dest='loglevel')
@@ -484,4 +561,4 @@ if __name__ == '__main__':
     main(csv_folder=args.csv, output_folder=args.output,
          wrs2_tiles=args.wrs2, years=args.years, months=args.months,
          skip_list_path=args.skiplist, id_type=args.id_type,
-         overwrite_flag=args.overwrite)
+         overwrite_flag=args.overwrite, threads=args.threads)